@@ -0,0 +1,13 @@
+# gunicorn.conf.py -- picked up automatically by `gunicorn main:app`
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"  # Render binds PORT
+
+# Threaded workers: requests in one process share the timezone and
+# ephemeris caches, and the TimezoneFinder data is loaded once per process.
+worker_class = "gthread"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+
+# Load the app before forking so workers share its memory copy-on-write
+preload_app = True
@@ -1,16 +1,21 @@
 # main.py
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 import swisseph as swe
+import orjson
 from timezonefinder import TimezoneFinder
-import pytz
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
 import os
+import re
 
 app = Flask(__name__)
-tf = TimezoneFinder()
+# in_memory keeps the polygon data in RAM; one shared instance per process
+tf = TimezoneFinder(in_memory=True)
 
 # Toggle to enable/disable the historical Ukraine fix
 FORCE_UA_UTC3_PRE1990 = True  # set False to disable
+_UTC3 = timedelta(hours=3)
 
 SIGNS = [
     "Aries", "Taurus", "Gemini", "Cancer",
@@ -18,6 +23,37 @@ SIGNS = [
     "Sagittarius", "Capricorn", "Aquarius", "Pisces"
 ]
 
+PLANETS = (
+    ("Sun", swe.SUN),
+    ("Moon", swe.MOON),
+    ("Mercury", swe.MERCURY),
+    ("Venus", swe.VENUS),
+    ("Mars", swe.MARS),
+    ("Jupiter", swe.JUPITER),
+    ("Saturn", swe.SATURN),
+    ("Uranus", swe.URANUS),
+    ("Neptune", swe.NEPTUNE),
+    ("Pluto", swe.PLUTO),
+)
+
+_DATE_RE = re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})")
+_TIME_RE = re.compile(r"(\d{1,2}):(\d{1,2})")
+
+# Fixed-offset zones (as returned by timezonefinder for open water) need no
+# transition lookup, so UT can be derived with plain arithmetic.
+# Note the POSIX sign convention: "Etc/GMT-2" is UTC+2.
+_FIXED_OFFSET = {"UTC": 0.0, "Etc/UTC": 0.0, "Etc/GMT": 0.0}
+_FIXED_OFFSET.update({"Etc/GMT%+d" % -h: float(h) for h in range(-12, 15) if h})
+
+@lru_cache(maxsize=4096)
+def _tz_at(lat_q, lon_q):
+    """Timezone name for coordinates quantized to 0.01° (~1 km)."""
+    return tf.timezone_at(lat=lat_q, lng=lon_q)
+
+@lru_cache(maxsize=512)
+def _tz(name):
+    return ZoneInfo(name)
+
 def deg_to_sign(deg):
     """
     Convert raw degree to zodiac sign and degree within the sign.
@@ -30,71 +66,184 @@ def deg_to_sign(deg):
     sign_deg = round(deg % 30, 2)
     return SIGNS[sign_index], sign_deg
 
-def get_local_and_ut(date_str, time_str, lat, lon):
+def degs_to_signs(degs):
     """
-    Build localized datetime using timezonefinder+pytz, then convert to UT.
+    Batch form of deg_to_sign: converts an iterable of float degrees in one
+    pass and returns a list of (sign, sign_deg) pairs in the same order.
+    """
+    signs = SIGNS
+    out = []
+    append = out.append
+    for deg in degs:
+        deg %= 360.0
+        # Multiply instead of float floor division; the clamp guards the
+        # 360.0 edge. Only the in-sign degree is rounded, never the sign.
+        sign_index = min(int(deg * (1 / 30.0)), 11)
+        append((signs[sign_index], round(deg - 30.0 * sign_index, 2)))
+    return out
+
+# Moshier analytic ephemeris: no ephemeris files to read, and speeds are not
+# requested. Its arcsecond-level error is invisible at 0.01° output precision.
+SWE_FLAGS = swe.FLG_MOSEPH
+
+# Ephemeris results keyed on jd_ut rounded to 1e-5 day (~1 s) and the
+# quantized coordinates, far below the sign-level output precision.
+# Both wrappers cache the converted (sign, deg) pairs, so a hit skips the
+# sign conversion as well as the ephemeris call.
+@lru_cache(maxsize=4096)
+def _planet_signs(jd_key):
+    """(sign, deg) for all PLANETS at jd_key, in PLANETS order."""
+    calc_ut, flags = swe.calc_ut, SWE_FLAGS
+    return tuple(degs_to_signs(
+        calc_ut(jd_key, pid, flags)[0][0] for _, pid in PLANETS
+    ))
+
+@lru_cache(maxsize=4096)
+def _angle_signs(jd_key, lat_key, lon_key):
+    """
+    (sign, deg) for ASC and MC. ascmc does not depend on the house system, so
+    use Equal houses (b"E") rather than iterating Placidus cusps we never read.
+    """
+    _, ascmc = swe.houses(jd_key, lat_key, lon_key, b"E")
+    return tuple(degs_to_signs(ascmc[:2]))
+
+def parse_date_time(date_str, time_str):
+    """
+    Parse "YYYY-MM-DD" and "HH:MM" into (y, m, d, hh, mm) ints.
+    Raises ValueError if either string is malformed or out of range.
+    """
+    dm = _DATE_RE.fullmatch(date_str)
+    tm = _TIME_RE.fullmatch(time_str)
+    if dm is None or tm is None:
+        raise ValueError("Expected date as YYYY-MM-DD and time as HH:MM")
+    fields = (int(dm[1]), int(dm[2]), int(dm[3]), int(tm[1]), int(tm[2]))
+    try:
+        datetime(*fields)
+    except ValueError:
+        raise ValueError(f"No such date/time: {date_str} {time_str}") from None
+    return fields
+
+def _clock_hours(dt):
+    return dt.hour + dt.minute / 60.0 + dt.second / 3600.0
+
+def get_local_and_ut(y, m, d, hh, mm, lat, lon):
+    """
+    Build localized datetime using timezonefinder+zoneinfo, then convert to UT.
     Safe regional fix:
       - If tz resolves to Europe/Kyiv (or Kiev) AND year < 1990, force UTC+3.
     """
-    y, m, d = map(int, date_str.split("-"))
-    hh, mm = map(int, time_str.split(":"))
     naive = datetime(y, m, d, hh, mm)
 
-    tz_name = tf.timezone_at(lat=lat, lng=lon)
+    tz_name = _tz_at(round(lat, 2), round(lon, 2))
 
     # If tz is unknown, assume provided time is already UT
     if not tz_name:
-        ut_hours = hh + mm / 60.0
+        ut_dt = naive.replace(tzinfo=timezone.utc)
         return {
             "tz_name": None,
             "utc_offset_hours": 0.0,
             "local_dt_iso": naive.isoformat(),
-            "ut_dt_iso": datetime(y, m, d, hh, mm, tzinfo=pytz.UTC).isoformat(),
-            "ut_hours": ut_hours
+            "ut_dt": ut_dt,
+            "ut_dt_iso": ut_dt.isoformat(),
+            "ut_hours": _clock_hours(ut_dt)
         }
 
-    tz = pytz.timezone(tz_name)
+    # Fast path: fixed offset, no localize/astimezone round-trip
+    off = _FIXED_OFFSET.get(tz_name)
+    if off is not None:
+        offset = timedelta(hours=off)
+        ut_dt = (naive - offset).replace(tzinfo=timezone.utc)
+        return {
+            "tz_name": tz_name,
+            "utc_offset_hours": off,
+            "local_dt_iso": naive.replace(tzinfo=timezone(offset)).isoformat(),
+            "ut_dt": ut_dt,
+            "ut_dt_iso": ut_dt.isoformat(),
+            "ut_hours": _clock_hours(ut_dt)
+        }
 
-    # Normal localization first
-    try:
-        local_dt = tz.localize(naive, is_dst=None)
-    except Exception:
-        local_dt = tz.localize(naive, is_dst=False)
+    tz = _tz(tz_name)
 
-    tz_label = tz.zone if hasattr(tz, "zone") else tz_name
-    offset = local_dt.utcoffset() or pytz.timedelta(0)
+    # Match the old pytz is_dst=False fallback: an ambiguous wall time takes
+    # the standard-time fold; non-existent times already do with fold=0.
+    local_dt = naive.replace(tzinfo=tz)
+    if local_dt.dst():
+        alt = local_dt.replace(fold=1)
+        if not alt.dst():
+            local_dt = alt
+
+    tz_label = tz.key
+    offset = local_dt.utcoffset() or timedelta(0)
     offset_hours = offset.total_seconds() / 3600.0
 
     # ---- precise & SAFE override for Ukraine in the 1980s ----
     if FORCE_UA_UTC3_PRE1990 and tz_label in ("Europe/Kyiv", "Europe/Kiev") and y < 1990:
         if abs(offset_hours - 3.0) > 1e-6:
-            forced_offset = 3.0
-            ut_hours = (hh + mm / 60.0) - forced_offset
-            ut_dt = datetime(
-                y, m, d,
-                int(ut_hours) % 24,
-                int((ut_hours % 1) * 60),
-                tzinfo=pytz.UTC
-            )
+            ut_dt = (naive - _UTC3).replace(tzinfo=timezone.utc)
             return {
                 "tz_name": f"{tz_label} (forced_UTC+3_pre1990)",
-                "utc_offset_hours": forced_offset,
+                "utc_offset_hours": 3.0,
                 "local_dt_iso": naive.isoformat(),
+                "ut_dt": ut_dt,
                 "ut_dt_iso": ut_dt.isoformat(),
-                "ut_hours": ut_hours
+                "ut_hours": _clock_hours(ut_dt)
             }
 
     # ---- default modern path (no override) ----
-    ut_dt = local_dt.astimezone(pytz.UTC)
-    ut_hours = ut_dt.hour + ut_dt.minute / 60.0 + ut_dt.second / 3600.0
+    # Reuse the offset found above rather than a second transition search
+    ut_dt = (naive - offset).replace(tzinfo=timezone.utc)
 
     return {
         "tz_name": tz_label,
         "utc_offset_hours": round(offset_hours, 2),
         "local_dt_iso": local_dt.isoformat(),
+        "ut_dt": ut_dt,
         "ut_dt_iso": ut_dt.isoformat(),
-        "ut_hours": ut_hours
+        "ut_hours": _clock_hours(ut_dt)
+    }
+
+@lru_cache(maxsize=8192)
+def compute_natal(y, m, d, hh, mm, lat_q, lon_q):
+    """
+    Serialized /natal response body for already-parsed date/time fields, with
+    lat/lon quantized to 0.001° (~100 m). Errors propagate and are not cached.
+    """
+    tzinfo = get_local_and_ut(y, m, d, hh, mm, lat_q, lon_q)
+
+    # julday takes the UT calendar date, which may differ from the local one
+    ut_dt = tzinfo["ut_dt"]
+    jd_ut = swe.julday(ut_dt.year, ut_dt.month, ut_dt.day, tzinfo["ut_hours"])
+    jd_key = round(jd_ut, 5)
+
+    # Angles & planet positions (Sun..Pluto)
+    (asc_sign, asc_sign_deg), (mc_sign, mc_sign_deg) = \
+        _angle_signs(jd_key, lat_q, lon_q)
+    planets = {
+        name: {"sign": p_sign, "deg": p_deg}
+        for (name, _), (p_sign, p_deg) in zip(PLANETS, _planet_signs(jd_key))
+    }
+
+    payload = {
+        "input_used": {
+            "date": f"{y:04d}-{m:02d}-{d:02d}",
+            "time_local": f"{hh:02d}:{mm:02d}",
+            "lat": lat_q,
+            "lon": lon_q
+        },
+        "timezone_used": {
+            "tz_name": tzinfo["tz_name"],
+            "utc_offset_hours": tzinfo["utc_offset_hours"],
+            "local_datetime": tzinfo["local_dt_iso"],
+            "ut_datetime": tzinfo["ut_dt_iso"],
+            "ut_decimal_hours": round(tzinfo["ut_hours"], 6),
+            "jd_ut": jd_ut
+        },
+        "Ascendant": {"sign": asc_sign, "deg": round(asc_sign_deg, 2)},
+        "MC":        {"sign": mc_sign,  "deg": round(mc_sign_deg,  2)},
+        "planets": planets
     }
+    # orjson instead of jsonify; sort keys to keep the same output
+    return orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)
 
 @app.route("/")
 def home():
@@ -112,69 +261,28 @@ def natal():
     if not (date and time and lat and lon):
         return jsonify({"error": "Need: date, time, lat, lon"}), 400
 
+    # Reject bad input before any timezone or ephemeris work
     try:
         lat_f = float(lat)
         lon_f = float(lon)
+        y, m, d, hh, mm = parse_date_time(date, time)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
 
-        tzinfo = get_local_and_ut(date, time, lat_f, lon_f)
-        ut = tzinfo["ut_hours"]
-
-        y, m, d = map(int, date.split("-"))
-        jd_ut = swe.julday(y, m, d, ut)
-
-        # Houses & angles (Placidus)
-        houses, ascmc = swe.houses(jd_ut, lat_f, lon_f, b"P")
-        asc_deg = ascmc[0]
-        mc_deg  = ascmc[1]
-
-        asc_sign, asc_sign_deg = deg_to_sign(asc_deg)
-        mc_sign,  mc_sign_deg  = deg_to_sign(mc_deg)
-
-        # Planet positions (Sun..Pluto)
-        planet_ids = {
-            "Sun": swe.SUN,
-            "Moon": swe.MOON,
-            "Mercury": swe.MERCURY,
-            "Venus": swe.VENUS,
-            "Mars": swe.MARS,
-            "Jupiter": swe.JUPITER,
-            "Saturn": swe.SATURN,
-            "Uranus": swe.URANUS,
-            "Neptune": swe.NEPTUNE,
-            "Pluto": swe.PLUTO
-        }
+    if not (-90.0 <= lat_f <= 90.0 and -180.0 <= lon_f <= 180.0):
+        return jsonify({"error": "Need: -90 <= lat <= 90, -180 <= lon <= 180"}), 400
 
-        planets = {}
-        for name, pid in planet_ids.items():
-            res = swe.calc_ut(jd_ut, pid)
-            lon_p = res[0] if isinstance(res, (list, tuple)) else res
-            p_sign, p_deg = deg_to_sign(lon_p)
-            planets[name] = {"sign": p_sign, "deg": round(p_deg, 2)}
-
-        return jsonify({
-            "input_used": {
-                "date": date,
-                "time_local": time,
-                "lat": lat_f,
-                "lon": lon_f
-            },
-            "timezone_used": {
-                "tz_name": tzinfo["tz_name"],
-                "utc_offset_hours": tzinfo["utc_offset_hours"],
-                "local_datetime": tzinfo["local_dt_iso"],
-                "ut_datetime": tzinfo["ut_dt_iso"],
-                "ut_decimal_hours": round(tzinfo["ut_hours"], 6),
-                "jd_ut": jd_ut
-            },
-            "Ascendant": {"sign": asc_sign, "deg": round(asc_sign_deg, 2)},
-            "MC":        {"sign": mc_sign,  "deg": round(mc_sign_deg,  2)},
-            "planets": planets
-        })
+    lat_q = round(lat_f, 3)
+    lon_q = round(lon_f, 3)
 
+    try:
+        body = compute_natal(y, m, d, hh, mm, lat_q, lon_q)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+    # Plain Response instead of jsonify (no app-context lookup)
+    return Response(body, mimetype="application/json")
+
 if __name__ == "__main__":
-    swe.set_ephe_path(".")
     port = int(os.environ.get("PORT", 8000))  # Render binds PORT
     app.run(host="0.0.0.0", port=port)